@@ -1,28 +1,60 @@
-from simple_query import get_db_connection
+import logging
+from functools import lru_cache
+from typing import Dict
+
+from db import execute_prepared, get_connection
+
+log = logging.getLogger("sqlgen")
+
+COLUMNS_SQL = """
+    SELECT column_name, data_type
+    FROM information_schema.columns
+    WHERE table_name = %s
+    ORDER BY ordinal_position
+"""
+
+# column_name -> data_type for the customers table, filled by load_columns().
+# Updated in place so modules that imported it see the loaded values.
+COLUMNS: Dict[str, str] = {}
+
+@lru_cache(maxsize=1)
+def fetch_columns():
+    """Fetch (column_name, data_type) rows for the customers table once per process"""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "cust_cols", COLUMNS_SQL, ("customers",))
+            return tuple(cur.fetchall())
+
+def load_columns():
+    """Populate COLUMNS from the database (called once at API startup)"""
+    columns = dict(fetch_columns())
+    COLUMNS.clear()
+    COLUMNS.update(columns)
+    return COLUMNS
+
+def invalidate_columns_cache():
+    """Forget the cached schema, e.g. after a migration"""
+    fetch_columns.cache_clear()
+    COLUMNS.clear()
 
 def get_columns():
     """Get all column names from the customers table"""
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'customers'
-                ORDER BY ordinal_position
-            """)
-            columns = cur.fetchall()
-            print("\nColumns in customers table:")
-            for col in columns:
-                print(f"- {col['column_name']} ({col['data_type']})")
-            return columns
-    except Exception as e:
-        print(f"Error: {e}")
+        return fetch_columns()
+    except Exception:
+        log.exception("Could not fetch the customers table columns")
+        return None
+
+def print_columns():
+    """Print the customers table columns (command-line helper)"""
+    columns = get_columns()
+    if columns is None:
         return None
-    finally:
-        if conn:
-            conn.close()
+    print("\nColumns in customers table:")
+    for column_name, data_type in columns:
+        print(f"- {column_name} ({data_type})")
+    return columns
 
 if __name__ == "__main__":
-    get_columns()
+    logging.basicConfig()
+    print_columns()
@@ -1,13 +1,115 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
+import weakref
+from contextlib import contextmanager
 
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Prepared statements belong to a server session and don't survive PgBouncer's
+# transaction pooling, so DB_PREPARE=0 falls back to plain execution.
+USE_PREPARED = os.getenv("DB_PREPARE", "1") == "1"
+_prepared = weakref.WeakKeyDictionary()
+
+# Session settings sent in the startup packet of every pooled connection, so a
+# runaway query can't hold a worker and a pool slot indefinitely.
+STATEMENT_TIMEOUT = os.getenv("DB_STATEMENT_TIMEOUT", "3s")
+IDLE_TX_TIMEOUT = os.getenv("DB_IDLE_TX_TIMEOUT", "5s")
+APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "simple_api")
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", 5))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", 20))
+# ThreadedConnectionPool raises PoolError instead of waiting once every
+# connection is out, so borrowers queue on this for up to DB_POOL_TIMEOUT.
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+_pool_slots = threading.BoundedSemaphore(POOL_MAX)
+
+# Connection settings, read from the environment once at import
+DB_KWARGS = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", 5432)),
+    database=os.getenv("DB_NAME", "customers_db"),
+    user=os.getenv("DB_USER", "postgres"),
+    password=os.getenv("DB_PASSWORD", "postgres"),
+    application_name=APPLICATION_NAME,
+    options=(
+        f"-c statement_timeout={STATEMENT_TIMEOUT} "
+        f"-c idle_in_transaction_session_timeout={IDLE_TX_TIMEOUT}"
+    ),
+)
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_KWARGS)
+    return _pool
+
+@contextmanager
 def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        port=os.getenv("DB_PORT", 5432),
-        database=os.getenv("DB_NAME", "customers_db"),
-        user=os.getenv("DB_USER", "postgres"),
-        password=os.getenv("DB_PASSWORD", "postgres"),
-        cursor_factory=RealDictCursor
-    )
+    """Borrow a connection from the pool, waiting for a free one, and hand it back when done."""
+    pool = get_pool()
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolError("connection pool exhausted")
+    try:
+        conn = pool.getconn()
+        try:
+            yield conn
+        finally:
+            pool.putconn(conn)
+    finally:
+        _pool_slots.release()
+
+def execute_prepared(cur, name, sql, params=()):
+    """Execute ``sql`` through the server-side prepared statement ``name``.
+
+    The statement is prepared the first time it runs on a connection and
+    executed by name afterwards, so Postgres skips parse and plan on repeat
+    calls. ``sql`` uses ordinary positional ``%s`` placeholders.
+    """
+    if not USE_PREPARED:
+        cur.execute(sql, params or None)
+        return
+    names = _prepared.setdefault(cur.connection, set())
+    if name not in names:
+        parts = sql.split("%s")
+        body = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+        cur.execute(f"PREPARE {name} AS {body}")
+        names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+def warm_pool(count=None):
+    """Open ``count`` connections up front and check each with ``SELECT 1``.
+
+    Connections beyond the pool's ``minconn`` are closed again when they are
+    returned, so the count defaults to ``DB_POOL_WARM`` (or the pool minimum).
+    """
+    if count is None:
+        count = int(os.getenv("DB_POOL_WARM", POOL_MIN))
+    pool = get_pool()
+    conns = []
+    try:
+        for _ in range(count):
+            conn = pool.getconn()
+            conns.append(conn)
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+
+def close_pool():
+    """Close every pooled connection (called on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
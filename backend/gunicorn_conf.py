@@ -0,0 +1,13 @@
+"""Gunicorn settings for production: gunicorn -c gunicorn_conf.py simple_api:app"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+# UvicornWorker runs each worker on uvloop/httptools when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app once in the master so workers share its code pages. The
+# connection pool and log listener are created per worker at startup.
+preload_app = True
+keepalive = 30
+accesslog = None
+loglevel = os.getenv("LOG_LEVEL", "warning").lower()
@@ -1,21 +1,120 @@
+import asyncio
+import logging
+import os
+import queue
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from logging.handlers import QueueHandler, QueueListener
+from typing import List
+
+import orjson
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from simple_query import query_database
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from simple_query import iter_query_rows, query_database
+from db import POOL_MAX, close_pool, warm_pool
+from check_columns import load_columns
+
+# Log records are handed to a queue and written by a listener thread, so
+# request handlers never block on stdout.
+log = logging.getLogger("sqlgen")
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_handler)
+log.addHandler(QueueHandler(_log_queue))
+log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+log.propagate = False
 
-app = FastAPI(title="Simple Customer Query API")
+def _json_default(value):
+    """Encode database values orjson doesn't handle natively (e.g. NUMERIC)."""
+    if isinstance(value, Decimal):
+        # NUMERIC NaN/Infinity have no int form; orjson writes their float as null
+        if not value.is_finite():
+            return float(value)
+        # Same convention as FastAPI's jsonable_encoder: whole numbers stay ints
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
 
-# Enable CORS
+class JSONResponse(ORJSONResponse):
+    """ORJSONResponse that also understands Decimal and other driver types."""
+    def render(self, content):
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the pool and load table metadata before serving; release the
+    connections and flush pending log records on shutdown."""
+    # Started here rather than at import so each worker process gets its own thread
+    _log_listener.start()
+    try:
+        await run_in_threadpool(warm_pool)
+    except Exception as e:
+        log.warning("Could not warm the connection pool: %s", e)
+    try:
+        await run_in_threadpool(load_columns)
+    except Exception as e:
+        log.warning("Could not load the customers table columns: %s", e)
+    try:
+        yield
+    finally:
+        close_pool()
+        _log_listener.stop()
+
+app = FastAPI(title="Simple Customer Query API", default_response_class=JSONResponse, lifespan=lifespan)
+
+# Enable CORS for the known front-ends only. "null" (sandboxed, data: and file:
+# pages) is opt-in through CORS_ORIGINS, since any site can produce it.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(","),
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
+    max_age=86400,
+)
+
+# NDJSON endpoints; gzip would buffer their rows instead of sending each as it's read
+_STREAM_PATHS = frozenset(["/query/stream"])
+
+class _GZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves the streaming NDJSON endpoints uncompressed."""
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in _STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Table rows are long arrays of repetitive values and compress very well
+app.add_middleware(_GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Short-lived cache of finished responses, keyed by the query text. Case is
+# kept: values are bound as typed, so 'Female' and 'female' can differ.
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+_RESP_CACHE = TTLCache(
+    maxsize=int(os.getenv("CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("CACHE_TTL", 30)),
 )
 
 class QueryRequest(BaseModel):
+    # Oversized or malformed bodies are rejected before they reach the database
+    model_config = ConfigDict(extra="forbid", frozen=True, str_max_length=2048)
+
     query: str
 
+# A batch runs at most this many queries at once, leaving the rest of the
+# connection pool to concurrent requests
+BATCH_CONCURRENCY = max(1, POOL_MAX // 2)
+
+class BatchRequest(BaseModel):
+    # Capped at the pool size; BATCH_CONCURRENCY limits how many run together
+    model_config = ConfigDict(extra="forbid", frozen=True, str_max_length=2048)
+
+    queries: List[str] = Field(..., max_length=POOL_MAX)
+
 @app.get("/")
 def health():
     return {"status": "Simple Customer Query API is running"}
@@ -23,103 +122,67 @@ def health():
 @app.post("/query")
 async def process_query(request: QueryRequest):
     """Process a natural language query and return results."""
+    # Responses are returned as JSONResponse directly so FastAPI skips
+    # jsonable_encoder and hands the body straight to orjson.
+    return JSONResponse(await _process_one(request.query))
+
+@app.post("/query/batch")
+async def process_batch(request: BatchRequest):
+    """Process several natural language queries concurrently, in order."""
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run(query):
+        async with slots:
+            return await _process_one(query)
+    
+    responses = await asyncio.gather(*(run(q) for q in request.queries))
+    return JSONResponse(responses)
+
+async def _process_one(query: str):
+    """Answer a single question, going through the response cache if enabled."""
+    if not CACHE_ENABLED:
+        return await _build_response(query)
+    
+    key = query.strip()
+    cached = _RESP_CACHE.get(key)
+    if cached is not None:
+        return {**cached, "query": query}
+    
+    response = await _build_response(query)
+    if response["type"] != "error":
+        _RESP_CACHE[key] = response
+    return response
+
+async def _build_response(query: str):
+    """Run the query and attach the original question to the response."""
     try:
-        # Get the query result
-        result = query_database(request.query)
-        
-        # If we got a dictionary response, handle it
-        if isinstance(result, dict):
-            # Ensure the response has all required fields
-            if 'type' not in result:
-                result['type'] = 'metric'  # Default type
-            if 'label' not in result:
-                result['label'] = 'Result'  # Default label
-            if 'value' not in result and 'data' in result:
-                # Try to extract a value if we have data
-                if len(result['data']) > 0 and isinstance(result['data'][0], dict):
-                    if 'count' in result['data'][0]:
-                        result['value'] = result['data'][0]['count']
-                    elif 'customer_count' in result['data'][0]:
-                        result['value'] = result['data'][0]['customer_count']
-            
-            # If it's an error response, include the query
-            if result.get('type') == 'error':
-                if 'query' not in result:
-                    result['query'] = request.query
-                return result
-                
-            # Handle successful query response
-            if 'value' in result:
-                return {
-                    "type": result['type'],
-                    "label": result.get('label', 'Result'),
-                    "value": result['value'],
-                    "query": request.query,
-                    "sql": result.get('sql', '')
-                }
-            elif 'rows' in result:
-                return {
-                    "type": "table",
-                    "columns": result.get('columns', []),
-                    "rows": result.get('rows', []),
-                    "query": request.query,
-                    "sql": result.get('sql', '')
-                }
-            elif 'data' in result:
-                return {
-                    "type": "table",
-                    "columns": list(result.get('data', [{}])[0].keys()) if result.get('data') else [],
-                    "rows": result.get('data', []),
-                    "query": request.query,
-                    "sql": result.get('sql', '')
-                }
-            return result
-            
-        # Handle list results (legacy format)
-        if isinstance(result, list):
-            if not result:  # Empty result
-                return {
-                    "type": "table",
-                    "columns": [],
-                    "rows": [],
-                    "query": request.query,
-                    "sql": request.query
-                }
-                
-            # If it's a count query (single value)
-            if len(result) == 1 and 'customer_count' in result[0]:
-                return {
-                    "type": "metric",
-                    "label": "Total Customers",
-                    "value": result[0]['customer_count'],
-                    "query": request.query,
-                    "sql": request.query
-                }
-                
-            # Regular table result
-            columns = list(result[0].keys()) if result else []
-            return {
-                "type": "table",
-                "columns": columns,
-                "rows": result,
-                "query": request.query,
-                "sql": request.query
-            }
-            
-        # Fallback for any other result type
-        return {
-            "type": "error",
-            "message": f"Unexpected result type: {type(result).__name__}",
-            "query": request.query
-        }
-        
+        # Get the query result off the event loop so other requests keep flowing
+        result = await run_in_threadpool(query_database, query)
+        # to_dict() already builds a fresh dict, so add the question in place
+        response = result.to_dict()
+        response["query"] = query
+        return response
     except Exception as e:
         return {
             "type": "error",
             "message": str(e),
-            "query": request.query
+            "query": query
         }
 
+@app.post("/query/stream")
+def stream_query(request: QueryRequest):
+    """Stream all table rows, without /query's row cap, as newline-delimited JSON."""
+    def lines():
+        try:
+            for row in iter_query_rows(request.query):
+                yield orjson.dumps(row, default=_json_default) + b"\n"
+        except Exception as e:
+            error = {"type": "error", "message": str(e), "query": request.query}
+            yield orjson.dumps(error) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
+    # Development server only; production runs under gunicorn (see gunicorn_conf.py)
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("simple_api:app", host="127.0.0.1", port=8000, reload=True)
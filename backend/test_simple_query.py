@@ -0,0 +1,123 @@
+"""Parser regression tests; no database needed. Run from backend/ with
+``python -m unittest``."""
+import unittest
+from decimal import Decimal
+
+from simple_query import parse_simple_query
+
+
+def parse(query):
+    return parse_simple_query(query)
+
+
+class UserTextStaysOutOfSqlTest(unittest.TestCase):
+    """Only known column names and bound placeholders may reach the SQL."""
+
+    INJECTIONS = [
+        'show customers where true;delete/**/from/**/customers-- 1',
+        'show customers where true;commit;select/**/1-- 1',
+        "show customers where pg_sleep(10)::text='x'",
+        'show customers where age > 30 and drop 1',
+        'show customers where x"y over 3',
+        'how many pg_shadow',
+        'count users',
+    ]
+
+    def test_unknown_identifiers_are_rejected(self):
+        for query in self.INJECTIONS:
+            with self.subTest(query=query):
+                result = parse(query)
+                self.assertEqual(result['type'], 'error')
+                self.assertIsNone(result['sql'])
+
+    def test_values_are_bound(self):
+        result = parse("show customers where gender is O'Brien; drop table customers")
+        self.assertEqual(result['sql'], 'SELECT * FROM customers WHERE gender ILIKE %(p0)s ORDER BY customerid LIMIT 1000')
+        self.assertEqual(result['params'], {'p0': "O'Brien; drop table customers"})
+
+    def test_direct_comparison_values_are_bound(self):
+        result = parse('customers with annual_income_k > 19')
+        self.assertEqual(result['sql'], 'SELECT * FROM customers WHERE annual_income_k > %(p0)s ORDER BY customerid LIMIT 1000')
+        self.assertEqual(result['params'], {'p0': 19})
+
+    def test_numeric_values_are_bound_as_numbers(self):
+        result = parse('customers where spending score over 50')
+        self.assertEqual(result['sql'], 'SELECT * FROM customers WHERE spending_score > %(p0)s ORDER BY customerid LIMIT 1000')
+        self.assertEqual(result['params'], {'p0': Decimal('50')})
+        self.assertEqual(parse('customers where credit score at least 600.5')['params'], {'p0': Decimal('600.5')})
+
+
+class WhereClauseTest(unittest.TestCase):
+
+    def test_where_comparison_is_not_duplicated(self):
+        result = parse('show customers where age > 30')
+        self.assertEqual(result['sql'], 'SELECT * FROM customers WHERE age > %(p0)s ORDER BY customerid LIMIT 1000')
+        self.assertEqual(len(result['params']), 1)
+
+    def test_or_clause_gets_no_extra_and(self):
+        result = parse('customers where age over 60 or age under 19')
+        self.assertEqual(
+            result['sql'],
+            'SELECT * FROM customers WHERE (age > %(p0)s) OR (age < %(p1)s) ORDER BY customerid LIMIT 1000'
+        )
+
+    def test_or_clause_is_grouped_with_direct_comparison(self):
+        result = parse('customers with age > 30 where gender is male or gender is female')
+        self.assertEqual(
+            result['sql'],
+            'SELECT * FROM customers WHERE ((gender ILIKE %(p0)s) OR (gender ILIKE %(p1)s))'
+            ' AND (age > %(p2)s) ORDER BY customerid LIMIT 1000'
+        )
+
+    def test_alias_resolves_to_column(self):
+        self.assertIn('annual_income_k >', parse('customers where income greater than 130')['sql'])
+        self.assertIn('age >', parse('customers WHERE Age > 30')['sql'])
+
+    def test_not_equal_text_is_negated(self):
+        result = parse('show customers where gender is not male')
+        self.assertIn('gender NOT ILIKE %(p0)s', result['sql'])
+        self.assertEqual(result['params'], {'p0': 'male'})
+
+    def test_text_comparisons_agree_across_phrasings(self):
+        for query in ('where gender is female', 'where gender = female', 'where gender female', 'where gender = "Female"'):
+            with self.subTest(query=query):
+                result = parse(f'show customers {query}')
+                self.assertIn('WHERE gender ILIKE %(p0)s', result['sql'])
+                self.assertEqual(result['params']['p0'].lower(), 'female')
+        self.assertIn('gender NOT ILIKE %(p0)s', parse('show customers where gender != male')['sql'])
+
+    def test_like_wildcards_are_escaped(self):
+        self.assertEqual(parse('show customers where category contains 100%')['params'], {'p0': '%100\\%%'})
+        self.assertEqual(parse('show customers where gender is a_b')['params'], {'p0': 'a\\_b'})
+
+
+class CountTest(unittest.TestCase):
+
+    def test_many_is_not_man(self):
+        result = parse('How many customers do we have?')
+        self.assertEqual(result['type'], 'metric')
+        self.assertEqual(result['sql'], 'SELECT COUNT(*) AS count FROM customers')
+
+    def test_gender_count_ignores_filler(self):
+        for query in ('how many females are there', 'count the customers who are female'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    parse(query)['sql'],
+                    "SELECT COUNT(*) AS count FROM customers WHERE LOWER(gender) = 'female'"
+                )
+
+    def test_count_condition_is_bound(self):
+        result = parse('count customers where age > 30')
+        self.assertEqual(result['sql'], 'SELECT COUNT(*) AS count FROM customers WHERE age > %(p0)s')
+
+    def test_or_condition_stays_inside_gender_filter(self):
+        result = parse('how many males where age > 60 or age < 20')
+        self.assertEqual(
+            result['sql'],
+            "SELECT COUNT(*) AS count FROM customers WHERE LOWER(gender) = 'male'"
+            " AND ((age > %(p0)s) OR (age < %(p1)s))"
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()